@@ -0,0 +1,228 @@
+import hashlib
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Exists, OuterRef, Value
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date
+from recipes.models import Recipe
+from users.models import Subscribe
+
+from .models import ModelVersion
+
+
+def make_etag(*parts):
+    return '"{}"'.format(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+def conditional(state_func, vary=(), **cache_control):
+    """ETag, Last-Modified и ответ 304 для действия ViewSet до сериализации.
+
+    state_func(request, **kwargs) возвращает пару (данные для ETag,
+    время последнего изменения) или None, если проверку нужно пропустить.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            state = state_func(request, **kwargs)
+            if state is None:
+                return method(self, request, *args, **kwargs)
+            etag_parts, last_modified = state
+            etag = make_etag(request.get_full_path(), *etag_parts)
+            timestamp = (
+                int(last_modified.timestamp()) if last_modified else None)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = method(self, request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+                if timestamp:
+                    response['Last-Modified'] = http_date(timestamp)
+                patch_cache_control(response, **cache_control)
+                if vary:
+                    patch_vary_headers(response, vary)
+            return response
+        return wrapper
+    return decorator
+
+
+def versions_state(*labels):
+    """Состояние по счетчикам изменений моделей из ModelVersion."""
+    def state(request, **kwargs):
+        versions = ModelVersion.objects.state(labels)
+        return (
+            [versions.get(label, (0, None))[0] for label in labels],
+            max((updated for _, updated in versions.values()), default=None),
+        )
+    return state
+
+
+def recipe_state(request, pk=None, **kwargs):
+    """Состояние рецепта с признаками текущего пользователя."""
+    user = request.user
+    if user.is_authenticated:
+        is_subscribed = Exists(Subscribe.objects.filter(
+            user=user, author=OuterRef('author')))
+    else:
+        is_subscribed = Value(False)
+    recipe = Recipe.objects.filter(pk=pk).with_user_flags(user).annotate(
+        is_subscribed=is_subscribed
+    ).values_list(
+        'updated', 'is_favorited', 'is_in_shopping_cart', 'is_subscribed'
+    ).first()
+    if recipe is None:
+        return None
+    labels = ('recipes.tag', 'recipes.ingredient', 'users.user')
+    versions = ModelVersion.objects.state(labels)
+    return (
+        [user.pk, *recipe, *(versions.get(label, (0,))[0]
+                             for label in labels)],
+        max([recipe[0], *(updated for _, updated in versions.values())]),
+    )
+
+
+class RecipeListCache:
+    """Кэш страниц списка рецептов для анонимных пользователей.
+
+    Ключ страницы строится из нормализованных параметров запроса и
+    поколений тех наборов рецептов, от которых она зависит: всех рецептов
+    для списка без фильтров, тегов и автора для отфильтрованного.
+    Изменение рецепта меняет поколения только его тегов и автора.
+    """
+    prefix = 'recipe-list'
+
+    @property
+    def cache(self):
+        return caches[settings.RECIPE_LIST_CACHE]
+
+    def _generations(self, names):
+        keys = [f'{self.prefix}:gen:{name}' for name in names]
+        generations = self.cache.get_many(keys)
+        for key in keys:
+            if key not in generations:
+                self.cache.add(key, uuid.uuid4().hex, timeout=None)
+                generations[key] = self.cache.get(key)
+        return [generations[key] for key in keys]
+
+    def key(self, request):
+        """Ключ страницы или None, если запрос не кэшируется."""
+        params = request.query_params
+        tags = sorted(set(params.getlist('tags')))
+        author = params.get('author', '')
+        page = params.get('page', '1')
+        limit = params.get('limit', '')
+        if not all(value.isdigit() for value in (page, limit, author)
+                   if value):
+            return None
+        names = ['catalog']
+        names += [f'tag:{slug}' for slug in tags]
+        if author:
+            names.append(f'author:{author}')
+        if not tags and not author:
+            names.append('recipes')
+        normalized = (
+            request.scheme, request.get_host(), tags, author, page, limit,
+            params.get('pagination', ''), params.get('cursor', ''),
+            params.get('ordering', ''), self._generations(names),
+        )
+        return '{}:page:{}'.format(
+            self.prefix,
+            hashlib.md5(repr(normalized).encode()).hexdigest()
+        )
+
+    def get(self, key):
+        data = self.cache.get(key)
+        self._count('hits' if data is not None else 'misses')
+        return data
+
+    def set(self, key, data):
+        self.cache.set(key, data, settings.RECIPE_LIST_CACHE_TIMEOUT)
+
+    def invalidate(self, tags=(), authors=(), recipes=False, catalog=False):
+        names = [f'tag:{slug}' for slug in tags]
+        names += [f'author:{author}' for author in authors]
+        if recipes:
+            names.append('recipes')
+        if catalog:
+            names.append('catalog')
+        self.cache.set_many(
+            {f'{self.prefix}:gen:{name}': uuid.uuid4().hex
+             for name in names},
+            timeout=None
+        )
+
+    def invalidate_recipe(self, recipe, tags=None):
+        if tags is None:
+            tags = recipe.tags.values_list('slug', flat=True)
+        self.invalidate(
+            tags=list(tags), authors=[recipe.author_id], recipes=True)
+
+    def _count(self, name):
+        key = f'{self.prefix}:{name}'
+        self.cache.add(key, 0, timeout=None)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, 1, timeout=None)
+
+    def stats(self):
+        counters = self.cache.get_many(
+            [f'{self.prefix}:hits', f'{self.prefix}:misses'])
+        return {
+            'hits': counters.get(f'{self.prefix}:hits', 0),
+            'misses': counters.get(f'{self.prefix}:misses', 0),
+        }
+
+
+recipe_list_cache = RecipeListCache()
+
+
+class FeedTimelineCache:
+    """Кэш первых рецептов ленты подписок пользователя.
+
+    Хранит id последних FEED_TIMELINE_SIZE рецептов авторов, на которых
+    подписан пользователь, если их не меньше FEED_TIMELINE_MIN_FOLLOWS:
+    для таких пользователей соединение с подписками и сортировка дороже
+    выборки по первичному ключу. Для остальных хранится пустой кортеж.
+    """
+    prefix = 'feed-timeline'
+
+    @property
+    def cache(self):
+        return caches[settings.RECIPE_LIST_CACHE]
+
+    def key(self, user_id):
+        return f'{self.prefix}:{user_id}'
+
+    def get(self, user):
+        key = self.key(user.pk)
+        timeline = self.cache.get(key)
+        if timeline is None:
+            timeline = ()
+            follows = Subscribe.objects.filter(user=user).count()
+            if follows >= settings.FEED_TIMELINE_MIN_FOLLOWS:
+                timeline = tuple(
+                    Recipe.objects.filter(author__subscribing__user=user)
+                    .order_by('-pub_date', '-id')
+                    .values_list('id', flat=True)
+                    [:settings.FEED_TIMELINE_SIZE]
+                )
+            self.cache.set(key, timeline, settings.FEED_TIMELINE_TIMEOUT)
+        return timeline
+
+    def invalidate(self, user_ids):
+        self.cache.delete_many([self.key(user_id) for user_id in user_ids])
+
+    def invalidate_followers(self, author_id):
+        self.invalidate(Subscribe.objects.filter(
+            author_id=author_id).values_list('user_id', flat=True))
+
+
+feed_timeline_cache = FeedTimelineCache()
@@ -0,0 +1,45 @@
+import csv
+import json
+
+
+class Echo:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def text_lines(rows):
+    separator = ''
+    for name, amount, measurement_unit in rows:
+        yield f'{separator}{name} - {measurement_unit} {amount}'
+        separator = '\n'
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for name, amount, measurement_unit in rows:
+        yield writer.writerow((name, measurement_unit, amount))
+
+
+def json_lines(rows):
+    separator = '['
+    for name, amount, measurement_unit in rows:
+        yield separator + json.dumps(
+            {
+                'name': name,
+                'measurement_unit': measurement_unit,
+                'amount': amount,
+            },
+            ensure_ascii=False
+        )
+        separator = ',\n'
+    yield '[]' if separator == '[' else ']'
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': ('text/plain; charset=utf-8', text_lines),
+    'csv': ('text/csv; charset=utf-8', csv_lines),
+    'json': ('application/json; charset=utf-8', json_lines),
+}
@@ -0,0 +1,111 @@
+from collections import defaultdict
+
+from recipes.images import RENDITIONS
+from recipes.models import Recipe, RecipeIngredient, Tag
+from users.models import User
+
+from .memberships import get_memberships
+
+RECIPE_FIELDS = (
+    'id', 'author_id', 'name', 'image', 'renditions', 'text',
+    'cooking_time', 'pub_date',
+)
+TAG_FIELDS = ('id', 'name', 'color', 'slug')
+AUTHOR_FIELDS = ('id', 'email', 'username', 'first_name', 'last_name')
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit', 'amount')
+
+
+class FastRecipeReadSerializer:
+    """Список рецептов в формате RecipeReadSerializer без полей DRF.
+
+    Принимает строки Recipe.objects.values(*RECIPE_FIELDS), связанные
+    данные выбирает тремя запросами values_list и собирает словари
+    напрямую. Порядок ключей и значения совпадают с RecipeReadSerializer,
+    что проверяет команда benchmark_serializers.
+    """
+
+    def __init__(self, rows, context=None):
+        self.rows = rows
+        self.context = context or {}
+
+    @staticmethod
+    def prepare(queryset):
+        return queryset.prefetch_related(None).values(*RECIPE_FIELDS)
+
+    def get_tags(self, recipe_ids):
+        tags = defaultdict(list)
+        for *tag, recipe_id in Tag.objects.filter(
+                recipe__in=recipe_ids).values_list(
+                *TAG_FIELDS, 'recipe__id'):
+            tags[recipe_id].append(dict(zip(TAG_FIELDS, tag)))
+        return tags
+
+    def get_authors(self, author_ids):
+        memberships = get_memberships(self.context.get('request'))
+        authors = {}
+        for author in User.objects.filter(pk__in=author_ids).values_list(
+                *AUTHOR_FIELDS):
+            data = dict(zip(AUTHOR_FIELDS, author))
+            data['is_subscribed'] = memberships.is_subscribed(author[0])
+            authors[author[0]] = data
+        return authors
+
+    def get_ingredients(self, recipe_ids):
+        ingredients = defaultdict(list)
+        for recipe_id, *ingredient in RecipeIngredient.objects.filter(
+                recipe__in=recipe_ids).values_list(
+                'recipe_id', 'ingredient_id', 'ingredient__name',
+                'ingredient__measurement_unit', 'amount'):
+            ingredients[recipe_id].append(
+                dict(zip(INGREDIENT_FIELDS, ingredient)))
+        return ingredients
+
+    @property
+    def data(self):
+        rows = list(self.rows)
+        if not rows:
+            return []
+        recipe_ids = [row['id'] for row in rows]
+        tags = self.get_tags(recipe_ids)
+        authors = self.get_authors({row['author_id'] for row in rows})
+        ingredients = self.get_ingredients(recipe_ids)
+
+        request = self.context.get('request')
+        absolute = request.build_absolute_uri if request else str
+        storage = Recipe._meta.get_field('image').storage
+        memberships = get_memberships(request)
+        favorites = memberships.ids('favorites')
+        cart = memberships.ids('cart')
+        return [
+            {
+                'id': row['id'],
+                'tags': tags[row['id']],
+                'author': authors[row['author_id']],
+                'ingredients': ingredients[row['id']],
+                'is_favorited': row['id'] in favorites,
+                'is_in_shopping_cart': row['id'] in cart,
+                'name': row['name'],
+                **self.image_urls(row, storage, absolute),
+                'text': row['text'],
+                'cooking_time': row['cooking_time'],
+            }
+            for row in rows
+        ]
+
+    @staticmethod
+    def image_urls(row, storage, absolute):
+        if not row['image']:
+            return {
+                'image': None,
+                'images': {name: None for name in RENDITIONS},
+            }
+        image = absolute(storage.url(row['image']))
+        renditions = row['renditions']
+        return {
+            'image': image,
+            'images': {
+                name: absolute(storage.url(renditions[name]))
+                if renditions.get(name) else image
+                for name in RENDITIONS
+            },
+        }
@@ -1,13 +1,125 @@
-import base64
-from django.core.files.base import ContentFile
+import binascii
+import hashlib
+import os
+from tempfile import SpooledTemporaryFile
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image
+from recipes.images import RENDITIONS
 from rest_framework import serializers
 
+BASE64_CHUNK_SIZE = 64 * 1024
+BASE64_WHITESPACE = ' \t\r\n'
+
+
+def base64_size(imgstr):
+    """Размер декодированных данных без учета переносов строк."""
+    length = len(imgstr) - sum(map(imgstr.count, BASE64_WHITESPACE))
+    return length // 4 * 3 - imgstr.rstrip()[-2:].count('=')
+
 
 class Base64ImageField(serializers.ImageField):
+    default_error_messages = {
+        'too_large': (
+            'Размер изображения не должен превышать {max_bytes} байт.'),
+        'too_many_pixels': (
+            'Изображение не должно содержать больше {max_pixels} пикселей.'),
+    }
+
+    def decode_chunks(self, imgstr):
+        """Части по границе групп из четырех символов, без пробелов."""
+        rest = ''
+        for start in range(0, len(imgstr), BASE64_CHUNK_SIZE):
+            piece = rest + ''.join(
+                imgstr[start:start + BASE64_CHUNK_SIZE].split())
+            end = len(piece) - len(piece) % 4
+            rest = piece[end:]
+            yield binascii.a2b_base64(piece[:end])
+        if rest:
+            yield binascii.a2b_base64(rest)
+
+    def decode(self, imgstr):
+        """Декодирует base64 по частям во временный файл."""
+        if base64_size(imgstr) > settings.IMAGE_MAX_BYTES:
+            self.fail('too_large', max_bytes=settings.IMAGE_MAX_BYTES)
+        decoded = SpooledTemporaryFile(max_size=BASE64_CHUNK_SIZE * 16)
+        try:
+            for chunk in self.decode_chunks(imgstr):
+                decoded.write(chunk)
+        except binascii.Error:
+            self.fail('invalid_image')
+        decoded.seek(0)
+        try:
+            width, height = Image.open(decoded).size
+        except Exception:
+            self.fail('invalid_image')
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            self.fail('too_many_pixels', max_pixels=settings.IMAGE_MAX_PIXELS)
+        decoded.seek(0)
+        return decoded
+
+    def is_same_content(self, imgstr, current):
+        """Совпадает ли base64 с файлом, названным по хешу содержимого."""
+        digest = os.path.splitext(os.path.basename(current.name))[0]
+        if len(digest) != 64:
+            return False
+        try:
+            if base64_size(imgstr) != current.size:
+                return False
+            sha256 = hashlib.sha256()
+            for chunk in self.decode_chunks(imgstr):
+                sha256.update(chunk)
+        except (OSError, binascii.Error):
+            return False
+        return sha256.hexdigest() == digest
+
+    def get_unchanged(self, data):
+        """Текущее изображение, если клиент прислал его же повторно.
+
+        Принимается ссылка на текущее изображение или base64 с тем же
+        содержимым — тогда файл не декодируется и не сохраняется заново.
+        """
+        instance = getattr(self.parent, 'instance', None)
+        current = getattr(instance, self.source, None)
+        if not current:
+            return None
+        if not data.startswith('data:image'):
+            same = urlparse(data).path == urlparse(current.url).path
+            return current if same else None
+        imgstr = data.partition(';base64,')[2]
+        return current if self.is_same_content(imgstr, current) else None
+
     def to_internal_value(self, data):
+        if isinstance(data, str):
+            unchanged = self.get_unchanged(data)
+            if unchanged is not None:
+                return unchanged
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
-            data = ContentFile(
-                base64.b64decode(imgstr), name=f'file.{ext}')
+            data = File(self.decode(imgstr), name=f'file.{ext}')
         return super().to_internal_value(data)
+
+
+class ImageRenditionsField(serializers.ReadOnlyField):
+    """Ссылки на уменьшенные копии изображения рецепта.
+
+    Пока копии не готовы, вместо них отдается исходное изображение.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if not recipe.image:
+            return {name: None for name in RENDITIONS}
+        request = self.context.get('request')
+        urls = {}
+        for name in RENDITIONS:
+            path = recipe.renditions.get(name)
+            url = recipe.image.storage.url(path) if path else recipe.image.url
+            urls[name] = request.build_absolute_uri(url) if request else url
+        return urls
@@ -0,0 +1,240 @@
+import base64
+import io
+import json
+import time
+from itertools import combinations
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+from recipes.models import Ingredient, Recipe, Tag
+from rest_framework.test import APIClient
+from users.models import Subscribe, User
+
+# Наибольшее число SQL-запросов и p95 в миллисекундах для каждого
+# эндпоинта. Число запросов не должно зависеть от размера страницы.
+BUDGETS = {
+    'users-list': (3, 150),
+    'users-retrieve': (2, 100),
+    'users-me': (1, 100),
+    'users-subscriptions': (4, 200),
+    'users-subscribe': (8, 200),
+    'users-unsubscribe': (6, 200),
+    'tags-list': (2, 100),
+    'tags-retrieve': (2, 100),
+    'ingredients-list': (1, 150),
+    'ingredients-search': (1, 100),
+    'ingredients-ranked': (1, 150),
+    'ingredients-retrieve': (2, 100),
+    'recipes-list': (7, 300),
+    'recipes-list-anonymous': (6, 300),
+    'recipes-retrieve': (6, 150),
+    'recipes-feed': (5, 300),
+    'recipes-create': (30, 500),
+    'recipes-update': (30, 500),
+    'recipes-delete': (20, 300),
+    'recipes-favorite': (8, 200),
+    'recipes-shopping-cart': (15, 300),
+    'recipes-download-shopping-cart': (3, 300),
+}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def image_base64():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), 'orange').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()).decode()
+
+
+class Command(BaseCommand):
+    help = 'Measure latency and SQL queries of every API endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', help='Email of the user to send requests as')
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Number of measured requests per endpoint')
+        parser.add_argument(
+            '--budgets', metavar='PATH',
+            help='JSON with [queries, p95 ms] per endpoint to override')
+        parser.add_argument(
+            '--queries-only', action='store_true',
+            help='Ignore latency budgets, e.g. on a slow machine')
+        parser.add_argument(
+            '--json', metavar='PATH', help='Save results as JSON')
+
+    def get_user(self, email):
+        if email:
+            return User.objects.get(email=email)
+        user = User.objects.filter(
+            recipes__isnull=False, subscriber__isnull=False,
+            shopping_user__isnull=False,
+        ).order_by('id').first()
+        if user is None:
+            raise CommandError(
+                'A user with recipes, subscriptions and a shopping cart '
+                'is required, run demo_data --bulk first')
+        return user
+
+    def get_endpoints(self, user):
+        """Запросы к каждому маршруту api/urls.py: (имя, метод, путь, ...)."""
+        recipe = Recipe.objects.filter(author=user).first()
+        other = Recipe.objects.exclude(
+            favorite_recipe__user=user).exclude(
+            shopping_recipe__user=user).exclude(author=user).first()
+        author = User.objects.exclude(
+            subscribing__user=user).exclude(pk=user.pk).first()
+        followed = Subscribe.objects.filter(user=user).first().author
+        tag = Tag.objects.first()
+        ingredients = list(Ingredient.objects.all()[:3])
+        payload = {
+            'name': 'Бенчмарк',
+            'text': 'Рецепт для замера производительности.',
+            'cooking_time': 10,
+            'image': image_base64(),
+            'tags': [tag.id],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 5}
+                for ingredient in ingredients
+            ],
+        }
+        prefix = ingredients[0].name[:2]
+
+        endpoints = [
+            ('users-list', 'get', '/api/users/', {}),
+            ('users-retrieve', 'get', f'/api/users/{author.id}/', {}),
+            ('users-me', 'get', '/api/users/me/', {}),
+            ('users-subscriptions', 'get', '/api/users/subscriptions/',
+             {'data': {'recipes_limit': 3}}),
+            ('users-subscribe', 'post',
+             f'/api/users/{author.id}/subscribe/', {}),
+            ('users-unsubscribe', 'delete',
+             f'/api/users/{followed.id}/subscribe/', {}),
+            ('tags-list', 'get', '/api/tags/', {}),
+            ('tags-retrieve', 'get', f'/api/tags/{tag.id}/', {}),
+            ('ingredients-list', 'get', '/api/ingredients/', {}),
+            ('ingredients-search', 'get', '/api/ingredients/',
+             {'data': {'name': prefix}}),
+            ('ingredients-ranked', 'get', '/api/ingredients/',
+             {'data': {'name': prefix, 'mode': 'ranked'}}),
+            ('ingredients-retrieve', 'get',
+             f'/api/ingredients/{ingredients[0].id}/', {}),
+            ('recipes-list-anonymous', 'get', '/api/recipes/',
+             {'anonymous': True}),
+            ('recipes-retrieve', 'get', f'/api/recipes/{recipe.id}/', {}),
+            ('recipes-feed', 'get', '/api/recipes/feed/', {}),
+            ('recipes-create', 'post', '/api/recipes/',
+             {'data': payload, 'format': 'json'}),
+            ('recipes-update', 'patch', f'/api/recipes/{recipe.id}/',
+             {'data': payload, 'format': 'json'}),
+            ('recipes-delete', 'delete', f'/api/recipes/{recipe.id}/', {}),
+            ('recipes-favorite', 'post',
+             f'/api/recipes/{other.id}/favorite/', {}),
+            ('recipes-shopping-cart', 'post',
+             f'/api/recipes/{other.id}/shopping_cart/', {}),
+        ]
+        filters = {
+            'tags': [slug for slug in Tag.objects.values_list(
+                'slug', flat=True)[:2]],
+            'author': author.id,
+            'is_favorited': 1,
+            'is_in_shopping_cart': 1,
+        }
+        for size in range(len(filters) + 1):
+            for names in combinations(filters, size):
+                endpoints.append((
+                    f'recipes-list[{",".join(names)}]', 'get',
+                    '/api/recipes/',
+                    {'data': {name: filters[name] for name in names}},
+                ))
+        for filetype in ('txt', 'csv', 'json'):
+            endpoints.append((
+                f'recipes-download-shopping-cart[{filetype}]', 'get',
+                '/api/recipes/download_shopping_cart/',
+                {'data': {'filetype': filetype}},
+            ))
+        return endpoints
+
+    def request(self, client, method, path, kwargs):
+        """Один запрос; изменения данных откатываются."""
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = getattr(client, method)(path, **kwargs)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{method.upper()} {path}: {response.status_code} '
+                f'{getattr(response, "data", "")}')
+        return elapsed * 1000, len(queries)
+
+    def measure(self, user, endpoint, repeat):
+        name, method, path, kwargs = endpoint
+        kwargs = dict(kwargs)
+        client = APIClient()
+        if not kwargs.pop('anonymous', False):
+            client.force_authenticate(user)
+        self.request(client, method, path, kwargs)
+        timings, queries = [], []
+        for _ in range(repeat):
+            elapsed, count = self.request(client, method, path, kwargs)
+            timings.append(elapsed)
+            queries.append(count)
+        return {
+            'name': name,
+            'p50': percentile(timings, 0.5),
+            'p95': percentile(timings, 0.95),
+            'queries': max(queries),
+        }
+
+    def handle(self, *args, **options):
+        budgets = dict(BUDGETS)
+        if options['budgets']:
+            with open(options['budgets']) as budgets_file:
+                budgets.update(json.load(budgets_file))
+        user = self.get_user(options['user'])
+
+        results, violations = [], []
+        with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                IMAGE_RENDITION_WORKERS=0):
+            for endpoint in self.get_endpoints(user):
+                result = self.measure(user, endpoint, options['repeat'])
+                results.append(result)
+                max_queries, max_p95 = budgets[result['name'].split('[')[0]]
+                problems = []
+                if result['queries'] > max_queries:
+                    problems.append(
+                        f'{result["queries"]} queries > {max_queries}')
+                if not options['queries_only'] and result['p95'] > max_p95:
+                    problems.append(f'p95 {result["p95"]:.1f}ms > {max_p95}')
+                line = (
+                    f'{result["name"]:<56} p50 {result["p50"]:7.1f}ms  '
+                    f'p95 {result["p95"]:7.1f}ms  '
+                    f'{result["queries"]:3} queries'
+                )
+                if problems:
+                    violations.append(f'{result["name"]}: ' + ', '.join(
+                        problems))
+                    self.stdout.write(self.style.ERROR(line))
+                else:
+                    self.stdout.write(line)
+
+        if options['json']:
+            with open(options['json'], 'w') as results_file:
+                json.dump(results, results_file, indent=2)
+        if violations:
+            raise CommandError(
+                'Budgets exceeded:\n' + '\n'.join(violations))
+        self.stdout.write(self.style.SUCCESS('All endpoints within budget'))
@@ -0,0 +1,140 @@
+import json
+import time
+
+from api.fast_serializers import FastRecipeReadSerializer
+from api.renderers import FastJSONRenderer, orjson
+from api.serializers import RecipeReadSerializer
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from recipes.models import Recipe
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Check that the fast recipe serializer and JSON renderer '
+            'match the DRF ones byte for byte and compare their speed')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', help='Email of the user to serialize recipes for')
+        parser.add_argument(
+            '--recipes', type=int, default=100,
+            help='Number of recipes per serialization')
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Number of measured serializations')
+
+    def make_request(self, user):
+        request = Request(RequestFactory().get('/api/recipes/'))
+        request.user = user
+        return request
+
+    def drf(self, queryset, request):
+        return RecipeReadSerializer(
+            queryset.with_related(), many=True,
+            context={'request': request}).data
+
+    def fast(self, queryset, request):
+        return FastRecipeReadSerializer(
+            FastRecipeReadSerializer.prepare(queryset),
+            context={'request': request}).data
+
+    def measure(self, func, queryset, request, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func(queryset, request)
+            timings.append(time.perf_counter() - started)
+        return min(timings) * 1000
+
+    def compare(self, expected, actual, what):
+        if expected != actual:
+            position = next(
+                index for index, (left, right)
+                in enumerate(zip(expected, actual)) if left != right
+            ) if len(expected) == len(actual) else min(
+                len(expected), len(actual))
+            raise CommandError(
+                '{} output differs at byte {}:\n'
+                'expected ...{}...\nactual   ...{}...'.format(
+                    what, position,
+                    expected[position - 60:position + 60].decode(
+                        errors='replace'),
+                    actual[position - 60:position + 60].decode(
+                        errors='replace'),
+                ))
+        return len(expected)
+
+    def render_throughput(self, render, data, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            size = len(render(data))
+            timings.append(time.perf_counter() - started)
+        return size / min(timings) / 1024 / 1024
+
+    def compare_renderers(self, data, repeat):
+        """Размер и скорость рендеринга одного и того же списка."""
+        renderers = {
+            'stdlib ascii': lambda value: json.dumps(value).encode(),
+            'DRF': JSONRenderer().render,
+            'fast': FastJSONRenderer().render,
+        }
+        self.compare(
+            renderers['DRF'](data), renderers['fast'](data), 'Fast renderer')
+        return ', '.join(
+            f'{name} {len(render(data))} bytes '
+            f'{self.render_throughput(render, data, repeat):.0f}MB/s'
+            for name, render in renderers.items()
+        )
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.get(email=options['user'])
+        else:
+            user = User.objects.filter(
+                favorites_user__isnull=False).order_by('id').first()
+        recipes = options['recipes']
+        ids = list(Recipe.objects.order_by(
+            '-pub_date', '-id').values_list('id', flat=True)[:recipes])
+        if not ids:
+            raise CommandError('No recipes, run demo_data --bulk first')
+        queryset = Recipe.objects.filter(pk__in=ids).order_by(
+            '-pub_date', '-id')
+
+        with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for label, current in (('anonymous', AnonymousUser()),
+                                   (str(user), user)):
+                if current is None:
+                    continue
+                request = self.make_request(current)
+                data = self.fast(queryset, request)
+                size = self.compare(
+                    JSONRenderer().render(self.drf(queryset, request)),
+                    JSONRenderer().render(data), 'Fast serializer')
+                drf = self.measure(
+                    self.drf, queryset, request, options['repeat'])
+                fast = self.measure(
+                    self.fast, queryset, request, options['repeat'])
+                scale = 100 / len(ids)
+                self.stdout.write(
+                    f'{label}: {len(ids)} recipes, {size} bytes identical; '
+                    f'per 100 recipes DRF {drf * scale:.1f}ms, '
+                    f'fast {fast * scale:.1f}ms '
+                    f'({drf / fast:.1f}x)'
+                )
+                self.stdout.write(
+                    f'{label} rendering: '
+                    f'{self.compare_renderers(data, options["repeat"])}')
+        if orjson is None:
+            self.stdout.write(
+                'orjson is not installed, FastJSONRenderer falls back '
+                'to JSONRenderer')
+        self.stdout.write(self.style.SUCCESS(
+            'Fast serializer and renderer output match DRF'))
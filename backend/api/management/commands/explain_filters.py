@@ -0,0 +1,89 @@
+import json
+import re
+from itertools import combinations
+
+from api.filters import RecipeFilter
+from api.pagination import CustomPaginator
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from recipes.models import Recipe, Tag
+from users.models import User
+
+FULL_SCAN = re.compile(
+    r'Seq Scan on recipes_recipe\b|SCAN (TABLE )?recipes_recipe$', re.M)
+
+
+def normalize_plan(plan):
+    return re.sub(r'\d+(\.\d+)?', '#', plan)
+
+
+class Command(BaseCommand):
+    help = 'Show query plans of recipe filter combinations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', help='Email of the user for user-specific filters')
+        parser.add_argument(
+            '--save', metavar='PATH', help='Save plans as a baseline')
+        parser.add_argument(
+            '--compare', metavar='PATH',
+            help='Fail if plans differ from a saved baseline')
+
+    def get_params(self):
+        tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+        author = Recipe.objects.values_list('author_id', flat=True).first()
+        return {
+            'tags': tags,
+            'author': author,
+            'is_favorited': 1,
+            'is_in_shopping_cart': 1,
+        }
+
+    def get_plans(self, user):
+        params = self.get_params()
+        plans = {}
+        for size in range(len(params) + 1):
+            for names in combinations(params, size):
+                request = RequestFactory().get(
+                    '/api/recipes/', {name: params[name] for name in names})
+                request.user = user
+                queryset = RecipeFilter(
+                    request.GET,
+                    queryset=Recipe.objects.all(),
+                    request=request,
+                ).qs[:CustomPaginator.page_size]
+                plans[', '.join(names) or 'no filters'] = queryset.explain()
+        return plans
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.get(email=options['user'])
+        else:
+            user = User.objects.order_by('id').first()
+        if user is None:
+            raise CommandError('At least one user is required')
+
+        plans = self.get_plans(user)
+        for name, plan in plans.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(plan)
+            if FULL_SCAN.search(plan):
+                self.stdout.write(self.style.WARNING(
+                    'Full scan of recipes_recipe'))
+
+        normalized = {
+            name: normalize_plan(plan) for name, plan in plans.items()}
+        if options['save']:
+            with open(options['save'], 'w') as baseline:
+                json.dump(normalized, baseline, ensure_ascii=False, indent=2)
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                expected = json.load(baseline)
+            changed = [
+                name for name in normalized
+                if normalized[name] != expected.get(name)
+            ]
+            if changed:
+                raise CommandError(
+                    'Query plans changed: ' + '; '.join(changed))
+            self.stdout.write(self.style.SUCCESS('Query plans unchanged'))
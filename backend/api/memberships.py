@@ -0,0 +1,96 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscribe
+
+SOURCES = {
+    'favorites': (Favorite, 'recipe_id'),
+    'cart': (ShoppingCart, 'recipe_id'),
+    'subscriptions': (Subscribe, 'author_id'),
+}
+
+
+def get_cache():
+    return caches[settings.RECIPE_LIST_CACHE]
+
+
+def generation_key(user_id):
+    return f'memberships:{user_id}:gen'
+
+
+def get_generation(user_id):
+    """Поколение множеств пользователя; создается при первом обращении."""
+    key = generation_key(user_id)
+    generation = get_cache().get(key)
+    if generation is None:
+        get_cache().add(
+            key, uuid.uuid4().hex, settings.MEMBERSHIP_CACHE_TIMEOUT)
+        generation = get_cache().get(key)
+    return generation
+
+
+def make_key(user_id, generation, kind):
+    return f'memberships:{user_id}:{generation}:{kind}'
+
+
+class Memberships:
+    """Множества id избранного, списка покупок и подписок пользователя.
+
+    Ключи множеств содержат поколение пользователя. Сигналы после
+    коммита меняют поколение, поэтому множество, загруженное из базы до
+    коммита и сохраненное позже, уже никем не читается.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._ids = None
+
+    def ids(self, kind):
+        if self.user is None or not self.user.is_authenticated:
+            return frozenset()
+        if self._ids is None:
+            self._generation = get_generation(self.user.pk)
+            keys = {
+                make_key(self.user.pk, self._generation, kind): kind
+                for kind in SOURCES
+            }
+            self._ids = {
+                keys[key]: ids
+                for key, ids in get_cache().get_many(keys).items()
+            }
+        if kind not in self._ids:
+            model, field = SOURCES[kind]
+            self._ids[kind] = frozenset(model.objects.filter(
+                user=self.user).values_list(field, flat=True))
+            get_cache().set(
+                make_key(self.user.pk, self._generation, kind),
+                self._ids[kind],
+                settings.MEMBERSHIP_CACHE_TIMEOUT)
+        return self._ids[kind]
+
+    def is_favorited(self, recipe_id):
+        return recipe_id in self.ids('favorites')
+
+    def is_in_shopping_cart(self, recipe_id):
+        return recipe_id in self.ids('cart')
+
+    def is_subscribed(self, author_id):
+        return author_id in self.ids('subscriptions')
+
+
+def get_memberships(request):
+    """Множества текущего пользователя, общие для всего запроса."""
+    if request is None:
+        return Memberships(None)
+    if not hasattr(request, 'memberships'):
+        request.memberships = Memberships(request.user)
+    return request.memberships
+
+
+def bump_generation(user_id):
+    """Новое поколение: следующий запрос загрузит множества заново."""
+    get_cache().set(
+        generation_key(user_id), uuid.uuid4().hex,
+        settings.MEMBERSHIP_CACHE_TIMEOUT)
@@ -0,0 +1,121 @@
+import json
+import logging
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+
+
+class RequestProfile:
+    """SQL-запросы и время этапов обработки одного запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = Counter()
+        self.db_time = 0
+        self.view_started = self.view_db_time = None
+        self.view_time = self.render_started = self.render_time = None
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries[sql] += 1
+
+    def start_view(self):
+        self.view_started = time.perf_counter()
+        self.view_db_time = self.db_time
+
+    def finish_view(self):
+        if self.view_started is not None:
+            self.view_time = time.perf_counter() - self.view_started
+        self.render_started = time.perf_counter()
+
+    def finish_render(self, response):
+        self.render_time = time.perf_counter() - self.render_started
+
+    def duplicates(self, threshold):
+        return {
+            sql: count for sql, count in self.queries.items()
+            if count > threshold
+        }
+
+
+class ProfilingMiddleware:
+    """Профилирование запросов к API.
+
+    Включается настройкой PROFILING_ENABLED для всех запросов или
+    заголовком X-Profile для администраторов. Результат отдается в
+    заголовке Server-Timing и пишется в лог одной JSON-строкой.
+    Время app — код представления без SQL, в основном сериализация.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not (settings.PROFILING_ENABLED
+                or PROFILE_HEADER in request.headers):
+            return self.get_response(request)
+        profile = request.profile = RequestProfile()
+        with connection.execute_wrapper(profile.record_query):
+            response = self.get_response(request)
+        user = getattr(request, 'user', None)
+        if settings.PROFILING_ENABLED or (user and user.is_staff):
+            self.report(request, response, profile)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(request, 'profile'):
+            request.profile.start_view()
+
+    def process_template_response(self, request, response):
+        if hasattr(request, 'profile'):
+            request.profile.finish_view()
+            response.add_post_render_callback(request.profile.finish_render)
+        return response
+
+    def report(self, request, response, profile):
+        total = time.perf_counter() - profile.started
+        match = request.resolver_match
+        duplicates = profile.duplicates(
+            settings.PROFILING_DUPLICATE_THRESHOLD)
+        data = {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': sum(profile.queries.values()),
+            'db_ms': round(profile.db_time * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+        }
+        timings = [
+            f'db;dur={data["db_ms"]};desc="{data["queries"]} queries"']
+        if profile.view_time is not None:
+            data['app_ms'] = round((
+                profile.view_time
+                - (profile.db_time - profile.view_db_time)) * 1000, 2)
+            timings.append(f'app;dur={data["app_ms"]}')
+        if profile.render_time is not None:
+            data['render_ms'] = round(profile.render_time * 1000, 2)
+            timings.append(f'render;dur={data["render_ms"]}')
+        timings.append(f'total;dur={data["total_ms"]}')
+        if not response.streaming:
+            data['size'] = len(response.content)
+            timings.append(f'size;desc="{data["size"]} bytes"')
+        if duplicates:
+            data['duplicates'] = duplicates
+            timings.append(f'dup;desc="{len(duplicates)} repeated queries"')
+            for sql, count in duplicates.items():
+                logger.warning(
+                    '%s executed the same query %s times: %s',
+                    data['endpoint'] or request.path, count, sql)
+        response['Server-Timing'] = ', '.join(timings)
+        logger.info(json.dumps(data, ensure_ascii=False))
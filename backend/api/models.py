@@ -0,0 +1,41 @@
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+class ModelVersionQuerySet(models.QuerySet):
+    def bump(self, label):
+        """Увеличивает счетчик изменений модели."""
+        if self.filter(label=label).update(
+                version=F('version') + 1, updated=timezone.now()):
+            return
+        try:
+            with transaction.atomic():
+                self.create(label=label, version=1)
+        except IntegrityError:
+            self.filter(label=label).update(
+                version=F('version') + 1, updated=timezone.now())
+
+    def state(self, labels):
+        """Версии и время последнего изменения моделей одним запросом."""
+        return {
+            label: (version, updated)
+            for label, version, updated in self.filter(
+                label__in=labels
+            ).values_list('label', 'version', 'updated')
+        }
+
+
+class ModelVersion(models.Model):
+    label = models.CharField('Модель', max_length=100, unique=True)
+    version = models.PositiveBigIntegerField('Версия', default=0)
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
+
+    objects = ModelVersionQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Версия модели'
+        verbose_name_plural = 'Версии моделей'
+
+    def __str__(self):
+        return f'{self.label} - {self.version}'
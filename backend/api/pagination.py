@@ -1,6 +1,13 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class CustomPaginator(PageNumberPagination):
     page_size = 6
     page_size_query_param = "limit"
+
+
+class RecipeCursorPaginator(CursorPagination):
+    """Постраничный вывод по курсору (pub_date, id) без подсчета записей."""
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
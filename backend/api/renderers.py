@@ -0,0 +1,33 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Компактный JSON в UTF-8 через orjson, если он установлен.
+
+    Без orjson, а также для ответов с отступами (browsable API,
+    ``Accept: application/json; indent=4``) и данных, которые orjson не
+    умеет сериализовать, работает как JSONRenderer. Даты и прочие
+    нестандартные типы кодируются тем же encoder, что и в DRF.
+    """
+    default = encoders.JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(
+                accepted_media_type, renderer_context or {}) is not None:
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data, default=self.default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+            b'\xe2\x80\xa9', b'\\u2029')
@@ -1,13 +1,14 @@
-from api.fields import Base64ImageField
+from api.fields import Base64ImageField, ImageRenditionsField
+from api.memberships import get_memberships
 from django.contrib.auth.password_validation import validate_password
 from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
+from recipes.images import schedule_renditions
 from recipes.models import (
-    Favorite,
     Ingredient,
     Recipe,
     RecipeIngredient,
-    ShoppingCart,
+    ShoppingCartTotal,
     Tag,
 )
 from rest_framework import serializers
@@ -24,11 +25,10 @@ class UserReadSerializer(UserSerializer):
                   'first_name', 'last_name', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if request and not request.user.is_anonymous:
-            return Subscribe.objects.filter(
-                user=request.user, author=obj).exists()
-        return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return get_memberships(
+            self.context.get('request')).is_subscribed(obj.id)
 
 
 class UserCreateSerializer(UserCreateSerializer):
@@ -81,12 +81,13 @@ class RecipeSerializer(serializers.ModelSerializer):
         required=False,
         allow_null=True
     )
+    images = ImageRenditionsField()
     name = serializers.ReadOnlyField()
     cooking_time = serializers.ReadOnlyField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time',)
+        fields = ('id', 'name', 'image', 'images', 'cooking_time',)
 
 
 class SubscriptionsSerializer(serializers.ModelSerializer):
@@ -102,20 +103,25 @@ class SubscriptionsSerializer(serializers.ModelSerializer):
                   'recipes_count', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        return user.is_authenticated and user.subscriber.filter(
-            user=user, author=obj
-        ).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return get_memberships(
+            self.context.get('request')).is_subscribed(obj.id)
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if limit:
-            recipes = recipes[:int(limit)]
+        if hasattr(obj, 'latest_recipes'):
+            recipes = obj.latest_recipes
+        else:
+            request = self.context.get('request')
+            limit = request.GET.get('recipes_limit')
+            recipes = obj.recipes.all()
+            if limit:
+                recipes = recipes[:int(limit)]
         serializer = RecipeSerializer(recipes, many=True, read_only=True)
         return serializer.data
 
@@ -193,26 +199,27 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         required=False,
         allow_null=True
     )
+    images = ImageRenditionsField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags',
                   'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart',
-                  'name', 'image',
+                  'name', 'image', 'images',
                   'text', 'cooking_time')
 
     def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        return user.is_authenticated and Favorite.objects.filter(
-            user=user, recipe=obj
-        ).exists()
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        return get_memberships(
+            self.context.get('request')).is_favorited(obj.id)
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context.get('request').user
-        return user.is_authenticated and ShoppingCart.objects.filter(
-            user=user, recipe=obj
-        ).exists()
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        return get_memberships(
+            self.context.get('request')).is_in_shopping_cart(obj.id)
 
 
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
@@ -227,7 +234,7 @@ class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
 class RecipeCreateSerializer(serializers.ModelSerializer):
     """[POST, PATCH, DELETE] Создание, изменение и удаление рецепта."""
     tags = serializers.ListField(
-        child=serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all()),
+        child=serializers.IntegerField(),
         write_only=True
     )
     author = UserReadSerializer(read_only=True)
@@ -275,6 +282,25 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Ингредиенты должны быть уникальны.')
 
+        tags = Tag.objects.in_bulk(attrs['tags'])
+        ingredients = Ingredient.objects.in_bulk(ingredient_ids)
+        errors = {}
+        missing_tags = sorted(set(attrs['tags']) - tags.keys())
+        if missing_tags:
+            errors['tags'] = [
+                f'Тег с id={pk} не существует.' for pk in missing_tags]
+        missing_ingredients = sorted(set(ingredient_ids) - ingredients.keys())
+        if missing_ingredients:
+            errors['ingredients'] = [
+                f'Ингредиент с id={pk} не существует.'
+                for pk in missing_ingredients
+            ]
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        attrs['tags'] = [tags[pk] for pk in attrs['tags']]
+        for item in attrs['ingredients']:
+            item['ingredient'] = ingredients[item['id']]
         return attrs
 
     def tags_and_ingredients_set(self, recipe, tags, ingredients):
@@ -283,7 +309,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             [
                 RecipeIngredient(
                     recipe=recipe,
-                    ingredient_id=ingredient['id'],
+                    ingredient=ingredient['ingredient'],
                     amount=ingredient['amount']
                 ) for ingredient in ingredients
             ])
@@ -296,27 +322,56 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             author=self.context['request'].user,
             **validated_data)
         self.tags_and_ingredients_set(recipe, tags, ingredients)
+        schedule_renditions(recipe)
         return recipe
 
+    def ingredients_update(self, recipe, ingredients):
+        current = {item.ingredient_id: item for item in recipe.recipes.all()}
+        old_amounts = {
+            ingredient_id: item.amount
+            for ingredient_id, item in current.items()
+        }
+        new_amounts = {item['id']: item['amount'] for item in ingredients}
+
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=item['ingredient'],
+                amount=item['amount']
+            ) for item in ingredients if item['id'] not in current
+        ])
+        changed = []
+        for ingredient_id, item in current.items():
+            if ingredient_id in new_amounts and (
+                    item.amount != new_amounts[ingredient_id]):
+                item.amount = new_amounts[ingredient_id]
+                changed.append(item)
+        RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        removed = current.keys() - new_amounts.keys()
+        if removed:
+            recipe.recipes.filter(ingredient_id__in=removed).delete()
+
+        ShoppingCartTotal.objects.change_recipe(
+            recipe, old_amounts, new_amounts)
+
     @transaction.atomic
     def update(self, instance, validated_data):
         tags_data = validated_data.pop('tags')
         ingredients_data = validated_data.pop('ingredients')
 
+        image_changed = (
+            'image' in validated_data
+            and validated_data['image'] is not instance.image
+        )
+        if image_changed:
+            validated_data['renditions'] = {}
         instance = super().update(instance, validated_data)
-
-        instance.tags.clear()
-        instance.tags.add(*tags_data)
-
-        instance.ingredients.clear()
-        for ingredient_data in ingredients_data:
-            RecipeIngredient.objects.update_or_create(
-                recipe=instance,
-                ingredient_id=ingredient_data['id'],
-                defaults={'amount': ingredient_data['amount']}
-            )
-
+        if image_changed:
+            schedule_renditions(instance)
+        instance.tags.set(tags_data)
+        self.ingredients_update(instance, ingredients_data)
         return instance
 
     def to_representation(self, instance):
+        instance = Recipe.objects.with_related().get(pk=instance.pk)
         return RecipeReadSerializer(instance, context=self.context).data
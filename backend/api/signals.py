@@ -0,0 +1,105 @@
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from users.models import Subscribe, User
+
+from .caching import feed_timeline_cache, recipe_list_cache
+from .memberships import bump_generation
+from .models import ModelVersion
+
+VERSIONED_MODELS = (Ingredient, Tag, User)
+
+
+def bump_version(sender, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    ModelVersion.objects.bump(sender._meta.label_lower)
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_version, sender=model)
+    post_delete.connect(bump_version, sender=model)
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_recipe_list_on_save(instance, **kwargs):
+    transaction.on_commit(
+        lambda: recipe_list_cache.invalidate_recipe(instance))
+
+
+@receiver(pre_delete, sender=Recipe)
+def invalidate_recipe_list_on_delete(instance, **kwargs):
+    tags = list(instance.tags.values_list('slug', flat=True))
+    transaction.on_commit(
+        lambda: recipe_list_cache.invalidate_recipe(instance, tags))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_list_on_tags(instance, action, pk_set, **kwargs):
+    if action == 'pre_clear':
+        tags = list(instance.tags.values_list('slug', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        tags = list(
+            Tag.objects.filter(pk__in=pk_set).values_list('slug', flat=True))
+    else:
+        return
+    transaction.on_commit(
+        lambda: recipe_list_cache.invalidate_recipe(instance, tags))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_recipe_list_catalog(**kwargs):
+    transaction.on_commit(
+        lambda: recipe_list_cache.invalidate(catalog=True))
+
+
+@receiver(post_save, sender=User)
+def invalidate_recipe_list_author(instance, update_fields=None, **kwargs):
+    """Страницы, в которых пользователь показан автором рецептов."""
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    if not Recipe.objects.filter(author=instance).exists():
+        return
+    tags = list(
+        Tag.objects.filter(recipe__author=instance)
+        .values_list('slug', flat=True).distinct())
+    transaction.on_commit(lambda: recipe_list_cache.invalidate(
+        tags=tags, authors=[instance.pk], recipes=True))
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_feed_on_publish(instance, created, **kwargs):
+    if created:
+        transaction.on_commit(
+            lambda: feed_timeline_cache.invalidate_followers(
+                instance.author_id))
+
+
+@receiver(post_delete, sender=Recipe)
+def invalidate_feed_on_delete(instance, **kwargs):
+    transaction.on_commit(
+        lambda: feed_timeline_cache.invalidate_followers(instance.author_id))
+
+
+@receiver((post_save, post_delete), sender=Subscribe)
+def invalidate_feed_on_subscribe(instance, **kwargs):
+    transaction.on_commit(
+        lambda: feed_timeline_cache.invalidate([instance.user_id]))
+
+
+def invalidate_memberships(sender, instance, created=True, **kwargs):
+    if created:
+        transaction.on_commit(
+            lambda: bump_generation(instance.user_id))
+
+
+for model in (Favorite, ShoppingCart, Subscribe):
+    post_save.connect(invalidate_memberships, sender=model)
+    post_delete.connect(invalidate_memberships, sender=model)
@@ -0,0 +1,127 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.test import RequestFactory, TestCase
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Tag,
+)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+from users.models import Subscribe, User
+
+from .fast_serializers import FastRecipeReadSerializer
+from .serializers import RecipeReadSerializer
+
+
+class RecipeFixtureMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='Иван', last_name='Иванов', password='p@ssw0rd1')
+        authors = [
+            User.objects.create_user(
+                email=f'author{i}@example.com', username=f'author{i}',
+                first_name='Ёлка', last_name='Автор', password='p@ssw0rd1')
+            for i in range(3)
+        ]
+        tags = [
+            Tag.objects.create(
+                name=f'Тег {i}', color='#E26C2D', slug=f'tag{i}')
+            for i in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(5)
+        ]
+        recipes = [
+            Recipe.objects.create(
+                author=authors[i % len(authors)], name=f'Рецепт {i}',
+                text='Описание', cooking_time=10 + i)
+            for i in range(cls.recipes_count)
+        ]
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag.pk)
+            for i, recipe in enumerate(recipes)
+            for tag in tags[:1 + i % len(tags)]
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient=ingredient, amount=j + 1)
+            for i, recipe in enumerate(recipes)
+            for j, ingredient in enumerate(ingredients[:2 + i % 4])
+        )
+        Favorite.objects.create(user=cls.user, recipe=recipes[0])
+        ShoppingCart.objects.create(user=cls.user, recipe=recipes[1])
+        Subscribe.objects.create(user=cls.user, author=authors[0])
+        cls.recipes = recipes
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class RecipeQueryCountTests(RecipeFixtureMixin, TestCase):
+    """Число запросов списка и рецепта не зависит от размера страницы."""
+    recipes_count = 60
+    # count, рецепты, теги, авторы, ингредиенты и три множества
+    # пользователя: избранное, список покупок и подписки.
+    list_queries = 8
+    # Два запроса состояния для ETag, рецепт, теги, автор, ингредиенты и
+    # множества пользователя.
+    retrieve_queries = 9
+
+    def test_list(self):
+        for limit in (6, 50):
+            with self.subTest(limit=limit):
+                self.setUp()
+                with self.assertNumQueries(self.list_queries):
+                    response = self.client.get(
+                        '/api/recipes/', {'limit': limit})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_retrieve(self):
+        with self.assertNumQueries(self.retrieve_queries):
+            response = self.client.get(f'/api/recipes/{self.recipes[0].pk}/')
+        self.assertEqual(response.status_code, 200)
+
+
+class FastRecipeReadSerializerTests(RecipeFixtureMixin, TestCase):
+    """Быстрый сериализатор совпадает с RecipeReadSerializer побайтно."""
+    recipes_count = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Recipe.objects.filter(pk=cls.recipes[0].pk).update(
+            image='recipes/ab/photo.jpg')
+        Recipe.objects.filter(pk=cls.recipes[1].pk).update(
+            image='recipes/cd/photo.png',
+            renditions={'thumbnail': 'recipes/renditions/ef/thumb.webp'})
+
+    def render(self, serializer_data):
+        return JSONRenderer().render(serializer_data)
+
+    def test_same_output(self):
+        queryset = Recipe.objects.order_by('-pub_date', '-id')
+        for user in (AnonymousUser(), self.user):
+            with self.subTest(user=user):
+                request = Request(RequestFactory().get('/api/recipes/'))
+                request.user = user
+                context = {'request': request}
+                expected = self.render(RecipeReadSerializer(
+                    queryset.with_related(), many=True,
+                    context=context).data)
+                actual = self.render(FastRecipeReadSerializer(
+                    FastRecipeReadSerializer.prepare(queryset),
+                    context=context).data)
+                self.assertEqual(actual, expected)
@@ -1,18 +1,38 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+import hashlib
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField, Count, Value
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
 from django_filters.rest_framework import DjangoFilterBackend
 from recipes.models import Favorite, Ingredient, Recipe, Tag
-from recipes.models import RecipeIngredient, ShoppingCart
-from rest_framework import filters, mixins, status, viewsets
+from recipes.models import ShoppingCart, ShoppingCartTotal
+from recipes.search import ingredient_index, ranked_search
+from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import (
+    AllowAny,
+    IsAdminUser,
+    IsAuthenticated,
+)
 from rest_framework.response import Response
 from users.models import Subscribe, User
 
+from .caching import (
+    conditional,
+    feed_timeline_cache,
+    recipe_list_cache,
+    recipe_state,
+    versions_state,
+)
+from .exporters import SHOPPING_LIST_FORMATS
+from .fast_serializers import FastRecipeReadSerializer
 from .filters import RecipeFilter
 from .mixins import ListRetrieveViewSet
-from .pagination import CustomPaginator
+from .pagination import CustomPaginator, RecipeCursorPaginator
 from .permissions import IsAuthorOrAdminOrReadOnly
 from .serializers import (
     IngredientSerializer,
@@ -61,8 +81,21 @@ class UserViewSet(mixins.CreateModelMixin, ListRetrieveViewSet):
         permission_classes=(IsAuthenticated,),
         pagination_class=CustomPaginator)
     def subscriptions(self, request):
-        queryset = User.objects.filter(subscribing__user=request.user)
+        queryset = User.objects.filter(
+            subscribing__user=request.user
+        ).annotate(
+            recipes_count=Count('recipes'),
+            is_subscribed=Value(True, BooleanField()),
+        ).order_by('id')
         page = self.paginate_queryset(queryset)
+        limit = request.query_params.get('recipes_limit')
+        latest_recipes = defaultdict(list)
+        for recipe in Recipe.objects.latest_by_authors(
+                [author.id for author in page],
+                int(limit) if limit and limit.isdigit() else None):
+            latest_recipes[recipe.author_id].append(recipe)
+        for author in page:
+            author.latest_recipes = latest_recipes[author.id]
         serializer = SubscriptionsSerializer(
             page, many=True,
             context={'request': request})
@@ -98,16 +131,43 @@ class IngredientViewSet(ListRetrieveViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ('^name',)
     permission_classes = (AllowAny,)
 
+    @conditional(
+        versions_state('recipes.ingredient'),
+        public=True, max_age=settings.HTTP_CACHE_MAX_AGE)
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name and request.query_params.get('mode') == 'ranked':
+            return Response(ranked_search(name))
+        if name:
+            return Response(ingredient_index.search(name))
+        return Response(ingredient_index.all())
+
+    @conditional(
+        versions_state('recipes.ingredient'),
+        public=True, max_age=settings.HTTP_CACHE_MAX_AGE)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class TagViewSet(ListRetrieveViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
+    @conditional(
+        versions_state('recipes.tag'),
+        public=True, max_age=settings.HTTP_CACHE_MAX_AGE)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional(
+        versions_state('recipes.tag'),
+        public=True, max_age=settings.HTTP_CACHE_MAX_AGE)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
@@ -116,11 +176,87 @@ class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        queryset = Recipe.objects.with_related()
+        if self.request.query_params.get('ordering') == 'popular':
+            queryset = queryset.order_by(
+                '-favorites_count', '-pub_date', '-id')
+        return queryset
+
+    @property
+    def paginator(self):
+        params = self.request.query_params
+        if (not hasattr(self, '_paginator') and self.action == 'list'
+                and params.get('ordering') != 'popular'
+                and (params.get('pagination') == 'cursor'
+                     or 'cursor' in params)):
+            self._paginator = RecipeCursorPaginator()
+        return super().paginator
+
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
             return RecipeReadSerializer
         return RecipeCreateSerializer
 
+    def paginated_recipes(self, queryset):
+        if not settings.FAST_RECIPE_SERIALIZER:
+            page = self.paginate_queryset(queryset)
+            serializer = RecipeReadSerializer(
+                page, many=True, context=self.get_serializer_context())
+            return self.get_paginated_response(serializer.data)
+        page = self.paginate_queryset(
+            FastRecipeReadSerializer.prepare(queryset))
+        serializer = FastRecipeReadSerializer(
+            page, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+    def list(self, request, *args, **kwargs):
+        key = None
+        if request.user.is_anonymous:
+            key = recipe_list_cache.key(request)
+        if key is None:
+            return self.paginated_recipes(
+                self.filter_queryset(self.get_queryset()))
+        data = recipe_list_cache.get(key)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+        response = self.paginated_recipes(
+            self.filter_queryset(self.get_queryset()))
+        if response.status_code == status.HTTP_200_OK:
+            recipe_list_cache.set(key, response.data)
+            response['X-Cache'] = 'MISS'
+        return response
+
+    @action(
+        detail=False, methods=['get'],
+        permission_classes=(IsAuthenticated,))
+    def feed(self, request):
+        paginator = self._paginator = RecipeCursorPaginator()
+        queryset = self.get_queryset().order_by('-pub_date', '-id')
+        timeline = feed_timeline_cache.get(request.user)
+        page_size = paginator.get_page_size(request)
+        if (timeline and 'cursor' not in request.query_params
+                and (page_size < len(timeline)
+                     or len(timeline) < settings.FEED_TIMELINE_SIZE)):
+            queryset = queryset.filter(pk__in=timeline[:page_size + 1])
+        else:
+            queryset = queryset.filter(
+                author__subscribing__user=request.user)
+        return self.paginated_recipes(queryset)
+
+    @action(
+        detail=False, methods=['get'],
+        permission_classes=(IsAdminUser,))
+    def cache_stats(self, request):
+        return Response(recipe_list_cache.stats())
+
+    @conditional(
+        recipe_state, vary=('Authorization', 'Cookie'),
+        private=True, no_cache=True)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @transaction.atomic
     def toggle_favorite_or_cart(
             self,
             request,
@@ -167,23 +303,30 @@ class RecipeViewSet(viewsets.ModelViewSet):
         detail=False, methods=['get'],
         permission_classes=(IsAuthenticated,))
     def download_shopping_cart(self, request):
-        ingredients = (
-            RecipeIngredient.objects
-            .filter(recipe__shopping_recipe__user=request.user)
-            .values('ingredient')
-            .annotate(total_amount=Sum('amount'))
+        filetype = request.query_params.get('filetype', 'txt')
+        if filetype not in SHOPPING_LIST_FORMATS:
+            return Response(
+                {'errors': 'Неизвестный формат списка покупок.'},
+                status=status.HTTP_400_BAD_REQUEST)
+        content_type, lines = SHOPPING_LIST_FORMATS[filetype]
+
+        ingredients = list(
+            ShoppingCartTotal.objects.filter(user=request.user)
+            .order_by('ingredient__name', 'ingredient__measurement_unit')
             .values_list(
                 'ingredient__name', 'total_amount',
                 'ingredient__measurement_unit')
         )
+        etag = 'W/"{}"'.format(hashlib.md5(
+            f'{filetype}:{ingredients}'.encode()
+        ).hexdigest())
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
 
-        wishlist = []
-        for item in ingredients:
-            wishlist.append(
-                f'{item[0]} - {item[2]} {item[1]}'
-            )
-
-        wishlist = '\n'.join(wishlist)
-        response = HttpResponse(wishlist, 'Content-Type: text/plain')
-        response['Content-Disposition'] = 'attachment; filename="wishlist.txt"'
+        response = StreamingHttpResponse(
+            lines(ingredients), content_type=content_type)
+        response['ETag'] = etag
+        response['Content-Disposition'] = (
+            f'attachment; filename="wishlist.{filetype}"')
         return response
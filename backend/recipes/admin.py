@@ -29,9 +29,9 @@ class RecipeAdmin(admin.ModelAdmin):
     list_filter = ('author', 'name', 'tags')
     inlines = (IngredientsInline,)
 
-    @staticmethod
-    def added_to_favorite(obj):
-        return obj.favorite.count()
+    @admin.display(description='В избранном', ordering='favorites_count')
+    def added_to_favorite(self, obj):
+        return obj.favorites_count
 
 
 @admin.register(models.RecipeIngredient)
@@ -40,10 +40,6 @@ class RecipeIngredientAdmin(admin.ModelAdmin):
     list_filter = ('recipe', 'ingredient')
     search_fields = ('recipe', 'ingredient')
 
-    @staticmethod
-    def added_to_favorite(obj):
-        return obj.favorite.count()
-
 
 @admin.register(models.Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
@@ -57,3 +53,12 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'recipe')
     list_filter = ('user', 'recipe')
     search_fields = ('user', 'recipe')
+
+
+@admin.register(models.ShoppingCartTotal)
+class ShoppingCartTotalAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk', 'user', 'ingredient', 'total_amount', 'recipes_count'
+    )
+    list_filter = ('user',)
+    search_fields = ('user__username', 'ingredient__name')
@@ -0,0 +1,80 @@
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import features, Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS = {
+    'thumbnail': (160, 160),
+    'card': (600, 600),
+    'full': (1600, 1600),
+}
+
+_executor = None
+
+
+def rendition_format():
+    return ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+
+
+def make_renditions(recipe):
+    """Создает уменьшенные копии изображения рецепта."""
+    storage = recipe.image.storage
+    image_format, ext = rendition_format()
+    renditions = {}
+    with recipe.image.open('rb') as image_file:
+        image = ImageOps.exif_transpose(Image.open(image_file)).convert('RGB')
+        for name, size in RENDITIONS.items():
+            rendition = image.copy()
+            rendition.thumbnail(size)
+            buffer = io.BytesIO()
+            rendition.save(buffer, image_format, quality=82)
+            renditions[name] = storage.save(
+                f'recipes/renditions/{name}.{ext}',
+                ContentFile(buffer.getvalue())
+            )
+    return renditions
+
+
+def process_recipe_image(recipe_id, image_name):
+    from recipes.models import Recipe
+
+    try:
+        recipe = Recipe.objects.filter(pk=recipe_id, image=image_name).first()
+        if recipe is None or not recipe.image:
+            return
+        recipe.renditions = make_renditions(recipe)
+        if Recipe.objects.filter(pk=recipe_id, image=image_name).exists():
+            recipe.save(update_fields=('renditions', 'updated'))
+    except Exception:
+        logger.exception('Image processing failed for recipe %s', recipe_id)
+
+
+def _process_in_worker(recipe_id, image_name):
+    try:
+        process_recipe_image(recipe_id, image_name)
+    finally:
+        connections.close_all()
+
+
+def schedule_renditions(recipe):
+    """Ставит обработку изображения в фоновый пул после коммита."""
+    global _executor
+
+    recipe_id, image_name = recipe.pk, recipe.image.name
+    if not settings.IMAGE_RENDITION_WORKERS:
+        transaction.on_commit(
+            lambda: process_recipe_image(recipe_id, image_name))
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_RENDITION_WORKERS,
+            thread_name_prefix='renditions'
+        )
+    transaction.on_commit(
+        lambda: _executor.submit(_process_in_worker, recipe_id, image_name))
@@ -0,0 +1,59 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from recipes.models import Recipe
+from recipes.storage import HASH_PATTERN, content_addressed_storage
+
+BLOB = re.compile(rf'recipes/(renditions/)?{HASH_PATTERN}')
+
+
+def walk(storage, path):
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield f'{path}/{name}'
+    for directory in directories:
+        yield from walk(storage, f'{path}/{directory}')
+
+
+class Command(BaseCommand):
+    help = 'Delete content-addressed recipe images no recipe refers to'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=60, metavar='MINUTES',
+            help='Keep files modified within this period (default: 60)'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only list orphaned files'
+        )
+
+    def handle(self, *args, **options):
+        storage = content_addressed_storage
+        if not storage.exists('recipes'):
+            return
+        threshold = timezone.now() - timedelta(minutes=options['grace'])
+        references = Recipe.objects.image_references()
+        candidates = [
+            name for name in walk(storage, 'recipes')
+            if BLOB.fullmatch(name) and not references[name]
+            and storage.get_modified_time(name) <= threshold
+        ]
+        # Ссылки и даты проверяются повторно: за время обхода файл мог
+        # снова понадобиться рецепту, сохраненному после первого снимка.
+        references = Recipe.objects.image_references()
+        deleted = freed = 0
+        for name in candidates:
+            if (references[name]
+                    or storage.get_modified_time(name) > threshold):
+                continue
+            deleted += 1
+            freed += storage.size(name)
+            self.stdout.write(name)
+            if not options['dry_run']:
+                storage.delete(name)
+        action = 'Found' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {deleted} orphaned files, {freed} bytes'))
@@ -1,96 +1,398 @@
 import csv
+import io
 import os
 import random
-from itertools import cycle
+import time
+from datetime import timedelta
+from itertools import accumulate, cycle, islice
 
+from api.caching import recipe_list_cache
+from api.models import ModelVersion
 from django.conf import settings
 from django.contrib.auth.hashers import make_password
 from django.core.files.images import ImageFile
 from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
 from faker import Faker
-from recipes.models import Ingredient, Tag
-from recipes.models import Recipe
-from recipes.models import RecipeIngredient
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingCartTotal,
+    Tag,
+)
+from recipes.search import ingredient_index
 from rest_framework.authtoken.models import Token
-from users.models import User
+from users.models import Subscribe, User
 
 fake = Faker(['ru_RU', ])
 
 DATA_DIR = os.path.join(settings.BASE_DIR, 'data')
+PHOTO_PATH = os.path.join(DATA_DIR, 'photo')
+TEXT_POOL_SIZE = 500
+PARETO_SHAPE = 2
+ZIPF_EXPONENT = 1.0
+PUB_DATE_SPREAD = 365 * 24 * 60 * 60
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def read_csv(file_path):
+    with open(file_path, 'r') as csv_file:
+        yield from csv.reader(csv_file)
+
+
+class PowerLaw:
+    """Выбор объектов с вероятностью, обратной их рангу (закон Ципфа)."""
+
+    def __init__(self, rng, population, exponent=ZIPF_EXPONENT):
+        self.random = rng
+        self.population = list(population)
+        rng.shuffle(self.population)
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent
+            for rank in range(1, len(self.population) + 1)
+        ))
+
+    def choices(self, count):
+        return self.random.choices(
+            self.population, cum_weights=self.cum_weights, k=count)
+
+    def sample(self, count):
+        """До count разных объектов, популярные выпадают чаще."""
+        return set(self.choices(min(count, len(self.population))))
+
+
+def next_id(model):
+    return (model.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
 
 
 class Command(BaseCommand):
     help = 'Create demo data'
 
-    def handle(self, *args, **options):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bulk', action='store_true',
+            help='Generate users and recipes with batched inserts'
+        )
+        parser.add_argument(
+            '--scale', type=int, default=1,
+            help='Multiplier for the number of demo users (4 per unit)'
+        )
+        parser.add_argument(
+            '--recipes-per-user', type=int, default=2,
+            help='Average number of recipes of a generated user'
+        )
+        parser.add_argument(
+            '--ingredients', type=float, default=6,
+            help='Average number of ingredients in a generated recipe'
+        )
+        parser.add_argument(
+            '--follows', type=float, default=10,
+            help='Average number of subscriptions of a generated user'
+        )
+        parser.add_argument(
+            '--favorites', type=float, default=15,
+            help='Average number of favorites of a generated user'
+        )
+        parser.add_argument(
+            '--cart', type=float, default=3,
+            help='Average number of recipes in a shopping cart'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Random seed, the same seed generates the same data'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Number of rows per INSERT'
+        )
 
-        def create_objects_from_csv(file_path, create_func):
-            with open(file_path, 'r') as csv_file:
-                reader = csv.reader(csv_file)
-                for row in reader:
-                    create_func(*row)
+    def report(self, label, rows, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{label}: {rows} rows in {elapsed:.2f}s '
+            f'({rows / max(elapsed, 1e-6):.0f} rows/s)'
+        )
 
-        def create_ingredient(name, measurement_unit):
-            Ingredient.objects.update_or_create(
-                name=name, measurement_unit=measurement_unit)
+    def bulk_insert(self, model, objects, ignore_conflicts=False):
+        started = time.perf_counter()
+        rows = 0
+        for batch in batches(objects, self.batch_size):
+            model.objects.bulk_create(
+                batch, ignore_conflicts=ignore_conflicts)
+            rows += len(batch)
+        self.report(model._meta.label, rows, started)
+        return rows
 
-        def create_tag(name, color, slug):
-            Tag.objects.update_or_create(name=name, color=color, slug=slug)
+    def announce_changes(self, models, recipes=False):
+        """Массовая вставка не отправляет сигналы, поэтому версии моделей
+        и кэши обновляются так же, как в api.signals, но явно."""
+        for model in models:
+            ModelVersion.objects.bump(model._meta.label_lower)
+        ingredient_index.invalidate()
+        transaction.on_commit(lambda: recipe_list_cache.invalidate(
+            recipes=recipes, catalog=True))
 
-        create_objects_from_csv(
-            os.path.join(DATA_DIR, 'ingredients.csv'),
-            create_ingredient
-        )
-        create_objects_from_csv(os.path.join(DATA_DIR, 'tags.csv'), create_tag)
-
-        if not User.objects.filter(email__startswith='user').exists():
-            all_ingredients = Ingredient.objects.all()
-            all_tags = Tag.objects.all()
-            PHOTO_PATH = os.path.join(DATA_DIR, 'photo')
-            image_cycle = cycle(range(1, 9))
-
-            for i in range(4):
-                user, created = User.objects.update_or_create(
-                    email=f'user{i}@example.com',
-                    defaults={
-                        'email': f'user{i}@example.com',
-                        'username': f'User{i}',
-                        'first_name': fake.first_name_male(),
-                        'last_name': fake.last_name_male(),
-                        'password': make_password('p@ssw0rd1'),
-                    },
+    def load_catalog(self):
+        """Ингредиенты и теги из CSV пачками вместо запроса на строку."""
+        self.bulk_insert(Ingredient, (
+            Ingredient(name=name, measurement_unit=measurement_unit)
+            for name, measurement_unit in read_csv(
+                os.path.join(DATA_DIR, 'ingredients.csv'))
+        ), ignore_conflicts=True)
+
+        tags = {
+            slug: Tag(name=name, color=color, slug=slug)
+            for name, color, slug in read_csv(
+                os.path.join(DATA_DIR, 'tags.csv'))
+        }
+        existing = Tag.objects.in_bulk(tags, field_name='slug')
+        for slug, tag in existing.items():
+            tags[slug].pk = tag.pk
+        Tag.objects.bulk_update(
+            [tags.pop(slug) for slug in existing], ('name', 'color'))
+        self.bulk_insert(Tag, tags.values())
+        self.announce_changes((Ingredient, Tag))
+
+    def create_demo_recipes(self):
+        all_ingredients = Ingredient.objects.all()
+        all_tags = Tag.objects.all()
+        image_cycle = cycle(range(1, 9))
+
+        for i in range(4):
+            user, created = User.objects.update_or_create(
+                email=f'user{i}@example.com',
+                defaults={
+                    'email': f'user{i}@example.com',
+                    'username': f'User{i}',
+                    'first_name': fake.first_name_male(),
+                    'last_name': fake.last_name_male(),
+                    'password': make_password('p@ssw0rd1'),
+                },
+            )
+            token, created = Token.objects.update_or_create(user=user)
+            for j in range(2):
+                ingredients = [random.choice(all_ingredients) for _ in
+                               range(4)]
+                tags = [random.choice(all_tags) for _ in range(2)]
+
+                image_file_path = os.path.join(
+                    PHOTO_PATH, f'{next(image_cycle)}.jpg')
+                with open(image_file_path, 'rb') as image_file:
+                    recipe = Recipe.objects.create(
+                        author=user,
+                        name=fake.sentence(
+                            nb_words=2, variable_nb_words=False),
+                        text=fake.paragraph(
+                            nb_sentences=5, variable_nb_sentences=False),
+                        cooking_time=random.randint(20, 120),
+                        image=ImageFile(image_file, name=f'{j + 1}.jpg'),
+                    )
+                    RecipeIngredient.objects.bulk_create(
+                        [
+                            RecipeIngredient(
+                                recipe=recipe,
+                                ingredient_id=ingredient.id,
+                                amount=random.randint(1, 100)
+                            ) for ingredient in ingredients
+                        ]
+                    )
+                    recipe.ingredients.set(ingredients)
+                    recipe.tags.set(tags)
+                    recipe.save()
+
+    def save_photos(self):
+        """Фотографии сохраняются один раз и переиспользуются рецептами."""
+        storage = Recipe._meta.get_field('image').storage
+        names = []
+        for number in range(1, 9):
+            with open(os.path.join(PHOTO_PATH, f'{number}.jpg'), 'rb') as f:
+                names.append(storage.save(
+                    f'recipes/{number}.jpg', ImageFile(f)))
+        return names
+
+    def insert_rows(self, model, field_names, rows):
+        """Вставка кортежей: COPY на PostgreSQL, пачки INSERT иначе."""
+        fields = [model._meta.get_field(name) for name in field_names]
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = ', '.join(
+            connection.ops.quote_name(field.column) for field in fields)
+        started = time.perf_counter()
+        count = 0
+        with connection.cursor() as cursor:
+            for batch in batches(rows, self.batch_size):
+                count += len(batch)
+                if connection.vendor == 'postgresql':
+                    buffer = io.StringIO()
+                    csv.writer(buffer).writerows(batch)
+                    buffer.seek(0)
+                    cursor.copy_expert(
+                        f'COPY {table} ({columns}) FROM STDIN '
+                        f'WITH (FORMAT csv)', buffer)
+                    continue
+                placeholders = ', '.join(['%s'] * len(fields))
+                cursor.executemany(
+                    f'INSERT INTO {table} ({columns}) '
+                    f'VALUES ({placeholders})',
+                    [
+                        [
+                            field.get_db_prep_save(value, connection)
+                            for field, value in zip(fields, row)
+                        ] for row in batch
+                    ]
                 )
-                token, created = Token.objects.update_or_create(user=user)
-                for j in range(2):
-                    ingredients = [random.choice(all_ingredients) for _ in
-                                   range(4)]
-                    tags = [random.choice(all_tags) for _ in range(2)]
-
-                    image_file_path = os.path.join(
-                        PHOTO_PATH, f'{next(image_cycle)}.jpg')
-                    with open(image_file_path, 'rb') as image_file:
-                        recipe = Recipe.objects.create(
-                            author=user,
-                            name=fake.sentence(
-                                nb_words=2, variable_nb_words=False),
-                            text=fake.paragraph(
-                                nb_sentences=5, variable_nb_sentences=False),
-                            cooking_time=random.randint(20, 120),
-                            image=ImageFile(image_file, name=f'{j + 1}.jpg'),
-                        )
-                        RecipeIngredient.objects.bulk_create(
-                            [
-                                RecipeIngredient(
-                                    recipe=recipe,
-                                    ingredient_id=ingredient.id,
-                                    amount=random.randint(1, 100)
-                                ) for ingredient in ingredients
-                            ]
-                        )
-                        recipe.ingredients.set(ingredients)
-                        recipe.tags.set(tags)
-                        recipe.save()
-        else:
-            print("Demo users already exist. Skipping demo data creation.")
-
-        self.stdout.write(self.style.SUCCESS('Data imported successfully'))
+        self.report(model._meta.label, count, started)
+
+    def generate_users(self, user_ids, password, now):
+        first_names = [fake.first_name() for _ in range(TEXT_POOL_SIZE)]
+        last_names = [fake.last_name() for _ in range(TEXT_POOL_SIZE)]
+        for user_id in user_ids:
+            yield (
+                user_id, f'user{user_id}@example.com', f'User{user_id}',
+                self.random.choice(first_names),
+                self.random.choice(last_names),
+                password, now, False, False, True, User.GUEST,
+            )
+
+    def generate_recipes(self, recipe_ids, authors, now):
+        names = [
+            fake.sentence(nb_words=2, variable_nb_words=False)
+            for _ in range(TEXT_POOL_SIZE)
+        ]
+        texts = [
+            fake.paragraph(nb_sentences=5, variable_nb_sentences=False)
+            for _ in range(TEXT_POOL_SIZE)
+        ]
+        images = cycle(self.save_photos())
+        for recipe_id, author_id in zip(recipe_ids, authors):
+            pub_date = now - timedelta(
+                seconds=self.random.randrange(PUB_DATE_SPREAD))
+            yield (
+                recipe_id, author_id,
+                self.random.choice(names), self.random.choice(texts),
+                self.random.randint(20, 120), next(images), {},
+                pub_date, pub_date, 0, 0,
+            )
+
+    def generate_recipe_ingredients(self, recipe_ids, mean):
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        popular = PowerLaw(self.random, ingredient_ids)
+        for recipe_id in recipe_ids:
+            count = self.random_count(mean, minimum=1)
+            for ingredient_id in popular.sample(count):
+                yield recipe_id, ingredient_id, self.random.randint(1, 500)
+
+    def generate_recipe_tags(self, recipe_ids):
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        for recipe_id in recipe_ids:
+            count = self.random.randint(1, len(tag_ids))
+            for tag_id in self.random.sample(tag_ids, count):
+                yield recipe_id, tag_id
+
+    def generate_pairs(self, user_ids, targets, mean, exclude_self=False):
+        """Пары пользователь-объект, популярность объектов по Ципфу."""
+        popular = PowerLaw(self.random, targets)
+        for user_id in user_ids:
+            for target_id in popular.sample(self.random_count(mean)):
+                if not (exclude_self and target_id == user_id):
+                    yield user_id, target_id
+
+    def random_count(self, mean, minimum=0):
+        """Число связей с распределением Парето и заданным средним."""
+        scale = mean * (PARETO_SHAPE - 1) / PARETO_SHAPE
+        return max(minimum, int(scale * self.random.paretovariate(
+            PARETO_SHAPE)))
+
+    def bulk_load(self, users_count, per_user, options):
+        """Пользователи, рецепты и связи между ними со степенным законом.
+
+        Первичные ключи назначаются заранее, чтобы связи можно было
+        вставлять без повторного чтения только что созданных строк; после
+        вставки последовательности сдвигаются за новые ключи. Число
+        рецептов автора, подписчиков, добавлений в избранное и покупки
+        у немногих объектов велико, у большинства — мало.
+        """
+        now = timezone.now()
+        first_user = next_id(User)
+        user_ids = range(first_user, first_user + users_count)
+        self.insert_rows(User, (
+            'id', 'email', 'username', 'first_name', 'last_name',
+            'password', 'date_joined', 'is_superuser', 'is_staff',
+            'is_active', 'role',
+        ), self.generate_users(user_ids, make_password('p@ssw0rd1'), now))
+        self.insert_rows(Token, ('key', 'user', 'created'), (
+            (f'{self.random.getrandbits(160):040x}', user_id, now)
+            for user_id in user_ids
+        ))
+
+        first_recipe = next_id(Recipe)
+        recipe_ids = range(first_recipe, first_recipe + users_count * per_user)
+        authors = PowerLaw(self.random, list(user_ids)).choices(
+            len(recipe_ids))
+        self.insert_rows(Recipe, (
+            'id', 'author', 'name', 'text', 'cooking_time', 'image',
+            'renditions', 'pub_date', 'updated', 'favorites_count',
+            'in_carts_count',
+        ), self.generate_recipes(recipe_ids, authors, now))
+        self.insert_rows(
+            RecipeIngredient, ('recipe', 'ingredient', 'amount'),
+            self.generate_recipe_ingredients(
+                recipe_ids, options['ingredients']))
+        self.insert_rows(
+            Recipe.tags.through, ('recipe', 'tag'),
+            self.generate_recipe_tags(recipe_ids))
+
+        self.insert_rows(Subscribe, ('user', 'author'), self.generate_pairs(
+            user_ids, list(user_ids), options['follows'], exclude_self=True))
+        self.insert_rows(Favorite, ('user', 'recipe'), self.generate_pairs(
+            user_ids, list(recipe_ids), options['favorites']))
+        self.insert_rows(ShoppingCart, ('user', 'recipe'), self.generate_pairs(
+            user_ids, list(recipe_ids), options['cart']))
+
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                    no_style(), (User, Recipe)):
+                cursor.execute(sql)
+        self.announce_changes((User,), recipes=True)
+        started = time.perf_counter()
+        Recipe.objects.rebuild_counters()
+        self.report('Recipe counters', len(recipe_ids), started)
+        started = time.perf_counter()
+        ShoppingCartTotal.objects.rebuild()
+        self.report(
+            ShoppingCartTotal._meta.label,
+            ShoppingCartTotal.objects.count(), started)
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.random = random.Random(options['seed'])
+        Faker.seed(options['seed'])
+        started = time.perf_counter()
+        with transaction.atomic():
+            self.load_catalog()
+            if options['bulk']:
+                self.bulk_load(
+                    4 * options['scale'], options['recipes_per_user'],
+                    options)
+            elif not User.objects.filter(
+                    email__startswith='user').exists():
+                self.create_demo_recipes()
+            else:
+                print("Demo users already exist. "
+                      "Skipping demo data creation.")
+        self.stdout.write(self.style.SUCCESS(
+            f'Data imported successfully in '
+            f'{time.perf_counter() - started:.2f}s'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from recipes.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Create missing image renditions for recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Recreate renditions for every recipe'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(renditions={})
+        processed = 0
+        for recipe_id, image_name in recipes.values_list(
+                'id', 'image').iterator():
+            process_recipe_image(recipe_id, image_name)
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} recipe images'))
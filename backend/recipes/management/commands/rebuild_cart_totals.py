@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.models import ShoppingCartTotal
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or check materialized shopping cart totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only compare stored totals with recomputed ones'
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            self.check_totals()
+            return
+        with transaction.atomic():
+            ShoppingCartTotal.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {ShoppingCartTotal.objects.count()} cart totals'))
+
+    def check_totals(self):
+        expected = {
+            (user_id, ingredient_id): (total_amount, recipes_count)
+            for user_id, ingredient_id, total_amount, recipes_count
+            in ShoppingCartTotal.objects.expected().iterator()
+        }
+        stored = {
+            (user_id, ingredient_id): (total_amount, recipes_count)
+            for user_id, ingredient_id, total_amount, recipes_count
+            in ShoppingCartTotal.objects.values_list(
+                'user_id', 'ingredient_id', 'total_amount', 'recipes_count'
+            ).iterator()
+        }
+        mismatches = 0
+        for key in expected.keys() | stored.keys():
+            if expected.get(key) != stored.get(key):
+                mismatches += 1
+                self.stdout.write(
+                    f'user={key[0]} ingredient={key[1]}: '
+                    f'stored={stored.get(key)} expected={expected.get(key)}'
+                )
+        if mismatches:
+            raise CommandError(
+                f'{mismatches} cart totals are inconsistent, '
+                f'run rebuild_cart_totals to fix them')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(stored)} cart totals are consistent'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Q
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or check favorite and shopping cart counters of recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only compare stored counters with recomputed ones'
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            self.check_counters()
+            return
+        updated = Recipe.objects.rebuild_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt counters of {updated} recipes'))
+
+    def check_counters(self):
+        expected = Recipe.objects.expected_counters()
+        mismatched = Recipe.objects.annotate(
+            expected_favorites=expected['favorites_count'],
+            expected_in_carts=expected['in_carts_count'],
+        ).filter(
+            ~Q(favorites_count=F('expected_favorites'))
+            | ~Q(in_carts_count=F('expected_in_carts'))
+        ).values_list(
+            'id', 'favorites_count', 'expected_favorites',
+            'in_carts_count', 'expected_in_carts',
+        )
+        mismatches = 0
+        for recipe_id, favorites, expected_favorites, in_carts, \
+                expected_in_carts in mismatched.iterator():
+            mismatches += 1
+            self.stdout.write(
+                f'recipe={recipe_id}: favorites {favorites} '
+                f'(expected {expected_favorites}), in carts {in_carts} '
+                f'(expected {expected_in_carts})'
+            )
+        if mismatches:
+            raise CommandError(
+                f'{mismatches} recipe counters are inconsistent, '
+                f'run rebuild_recipe_counters to fix them')
+        self.stdout.write(self.style.SUCCESS('Recipe counters are consistent'))
@@ -0,0 +1,60 @@
+# Generated by Django 3.2.19 on 2026-10-18 02:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_shopping_cart_totals(apps, schema_editor):
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingCartTotal = apps.get_model('recipes', 'ShoppingCartTotal')
+    totals = (
+        RecipeIngredient.objects
+        .filter(recipe__shopping_recipe__isnull=False)
+        .values_list('recipe__shopping_recipe__user', 'ingredient')
+        .annotate(
+            total_amount=models.Sum('amount'),
+            recipes_count=models.Count('id'),
+        )
+        .order_by()
+    )
+    ShoppingCartTotal.objects.bulk_create(
+        ShoppingCartTotal(
+            user_id=user_id,
+            ingredient_id=ingredient_id,
+            total_amount=total_amount,
+            recipes_count=recipes_count,
+        ) for user_id, ingredient_id, total_amount, recipes_count in totals
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.IntegerField(default=0, verbose_name='Количество')),
+                ('recipes_count', models.IntegerField(default=0, verbose_name='Рецептов в списке')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_totals', to='recipes.ingredient')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_totals', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Итог списка покупок',
+                'verbose_name_plural': 'Итоги списков покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcarttotal',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_cart_total'),
+        ),
+        migrations.RunPython(
+            fill_shopping_cart_totals, migrations.RunPython.noop
+        ),
+    ]
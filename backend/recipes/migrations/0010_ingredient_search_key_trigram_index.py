@@ -0,0 +1,37 @@
+from django.db import migrations
+
+OLD_INDEX = (
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_trgm '
+    'ON recipes_ingredient USING gin (name gin_trgm_ops)'
+)
+NEW_INDEX = (
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_search_key_trgm '
+    'ON recipes_ingredient USING gin '
+    "((translate(lower(name), 'ё', 'е')) gin_trgm_ops)"
+)
+
+
+def create_search_key_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(NEW_INDEX)
+    schema_editor.execute('DROP INDEX IF EXISTS recipes_ingredient_name_trgm')
+
+
+def drop_search_key_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(OLD_INDEX)
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS recipes_ingredient_search_key_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_popularity_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_key_index, drop_search_key_index),
+    ]
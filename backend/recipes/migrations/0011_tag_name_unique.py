@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+def rename_duplicate_tags(apps, schema_editor):
+    Tag = apps.get_model('recipes', 'Tag')
+    seen = set()
+    for tag in Tag.objects.order_by('id'):
+        if tag.name in seen:
+            suffix = f' ({tag.pk})'
+            tag.name = tag.name[:50 - len(suffix)] + suffix
+            tag.save(update_fields=('name',))
+        seen.add(tag.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_ingredient_search_key_trigram_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicate_tags, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tag',
+            name='name',
+            field=models.CharField(max_length=50, unique=True, verbose_name='Название тега'),
+        ),
+    ]
@@ -1,5 +1,22 @@
+from collections import Counter
+
 from django.core.validators import RegexValidator
 from django.db import models
+from django.db.models import (
+    Case,
+    Count,
+    Exists,
+    F,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    Sum,
+    Value,
+    When,
+    Window,
+)
+from django.db.models.functions import Coalesce, RowNumber
+from recipes.storage import content_addressed_storage
 from users.models import User
 
 
@@ -47,12 +64,88 @@ class Tag(models.Model):
         return self.name
 
 
+def count_by_recipe(model):
+    return Coalesce(Subquery(
+        model.objects.filter(recipe=OuterRef('pk')).order_by()
+        .values('recipe').annotate(count=Count('id')).values('count')
+    ), 0)
+
+
+class RecipeQuerySet(models.QuerySet):
+    def with_user_flags(self, user):
+        """Признаки избранного и списка покупок одним запросом."""
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False, models.BooleanField()),
+                is_in_shopping_cart=Value(False, models.BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        )
+
+    def with_related(self):
+        """Автор, теги и ингредиенты рецептов фиксированным числом запросов."""
+        return self.prefetch_related(
+            'tags',
+            'author',
+            Prefetch(
+                'recipes',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        )
+
+    def latest_by_authors(self, author_ids, limit=None):
+        """Последние рецепты каждого из авторов одним оконным запросом."""
+        if not author_ids:
+            return self.none()
+        recipes = self.filter(author_id__in=author_ids)
+        if limit is None:
+            return recipes
+        ranked = recipes.annotate(position=Window(
+            RowNumber(),
+            partition_by=F('author_id'),
+            order_by=(F('pub_date').desc(), F('id').desc()),
+        ))
+        sql, params = ranked.query.sql_with_params()
+        return self.raw(
+            f'SELECT * FROM ({sql}) ranked '
+            f'WHERE position <= %s ORDER BY author_id, position',
+            (*params, limit)
+        )
+
+    def expected_counters(self):
+        """Счетчики избранного и списков покупок, посчитанные заново."""
+        return {
+            'favorites_count': count_by_recipe(Favorite),
+            'in_carts_count': count_by_recipe(ShoppingCart),
+        }
+
+    def rebuild_counters(self):
+        return self.update(**self.expected_counters())
+
+    def image_references(self):
+        """Число ссылок рецептов на каждый файл изображения и его копий."""
+        references = Counter()
+        for image, renditions in self.exclude(image='').values_list(
+                'image', 'renditions').iterator():
+            references[image] += 1
+            references.update(renditions.values())
+        return references
+
+
 class Recipe(models.Model):
     name = models.CharField(
         'Название рецепта', max_length=200
     )
     image = models.ImageField(
-        'Изображение', upload_to='recipes/', blank=True
+        'Изображение', upload_to='recipes/', blank=True,
+        storage=content_addressed_storage
+    )
+    renditions = models.JSONField(
+        'Уменьшенные копии изображения', default=dict, blank=True
     )
     text = models.TextField(
         'Описание рецепта'
@@ -74,9 +167,33 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         'Дата публикации', auto_now_add=True
     )
+    updated = models.DateTimeField(
+        'Дата изменения', auto_now=True
+    )
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное', default=0
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'Добавлений в список покупок', default=0
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'), name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('-favorites_count', '-pub_date', '-id'),
+                name='recipe_popular_idx'
+            ),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -153,3 +270,119 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.user} - {self.recipe}'
+
+
+class ShoppingCartTotalQuerySet(models.QuerySet):
+    def apply_changes(self, user_ids, changes):
+        """Изменяет итоги: {ингредиент: (количество, число рецептов)}."""
+        changes = {
+            ingredient_id: change for ingredient_id, change in changes.items()
+            if change != (0, 0)
+        }
+        if not user_ids or not changes:
+            return
+        added = [
+            ingredient_id for ingredient_id, (_, recipes) in changes.items()
+            if recipes > 0
+        ]
+        if added:
+            self.bulk_create(
+                [
+                    self.model(user_id=user_id, ingredient_id=ingredient_id)
+                    for user_id in user_ids for ingredient_id in added
+                ],
+                ignore_conflicts=True
+            )
+        totals = self.filter(user_id__in=user_ids, ingredient_id__in=changes)
+        totals.update(
+            total_amount=F('total_amount') + Case(
+                *[When(ingredient_id=ingredient_id, then=Value(amount))
+                  for ingredient_id, (amount, _) in changes.items()],
+                default=Value(0), output_field=models.IntegerField()
+            ),
+            recipes_count=F('recipes_count') + Case(
+                *[When(ingredient_id=ingredient_id, then=Value(recipes))
+                  for ingredient_id, (_, recipes) in changes.items()],
+                default=Value(0), output_field=models.IntegerField()
+            ),
+        )
+        totals.filter(recipes_count__lte=0).delete()
+
+    def add_recipe(self, recipe_id, user_ids):
+        self.apply_changes(user_ids, {
+            ingredient_id: (amount, 1)
+            for ingredient_id, amount in RecipeIngredient.objects.filter(
+                recipe_id=recipe_id).values_list('ingredient_id', 'amount')
+        })
+
+    def remove_recipe(self, recipe_id, user_ids):
+        self.apply_changes(user_ids, {
+            ingredient_id: (-amount, -1)
+            for ingredient_id, amount in RecipeIngredient.objects.filter(
+                recipe_id=recipe_id).values_list('ingredient_id', 'amount')
+        })
+
+    def change_recipe(self, recipe, old_amounts, new_amounts):
+        """Переносит изменение состава рецепта в списки покупок."""
+        user_ids = list(
+            recipe.shopping_recipe.values_list('user_id', flat=True))
+        self.apply_changes(user_ids, {
+            ingredient_id: (
+                new_amounts.get(ingredient_id, 0)
+                - old_amounts.get(ingredient_id, 0),
+                (ingredient_id in new_amounts)
+                - (ingredient_id in old_amounts),
+            )
+            for ingredient_id in old_amounts.keys() | new_amounts.keys()
+        })
+
+    def expected(self):
+        """Итоги, пересчитанные заново по рецептам в списках покупок."""
+        return (
+            RecipeIngredient.objects
+            .filter(recipe__shopping_recipe__isnull=False)
+            .values_list('recipe__shopping_recipe__user', 'ingredient')
+            .annotate(total_amount=Sum('amount'), recipes_count=Count('id'))
+            .order_by()
+        )
+
+    def rebuild(self, batch_size=1000):
+        self.all().delete()
+        self.bulk_create(
+            (
+                self.model(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    total_amount=total_amount,
+                    recipes_count=recipes_count,
+                ) for user_id, ingredient_id, total_amount, recipes_count
+                in self.expected().iterator()
+            ),
+            batch_size=batch_size
+        )
+
+
+class ShoppingCartTotal(models.Model):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='shopping_totals'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE, related_name='shopping_totals'
+    )
+    total_amount = models.IntegerField('Количество', default=0)
+    recipes_count = models.IntegerField('Рецептов в списке', default=0)
+
+    objects = ShoppingCartTotalQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_cart_total'
+            )
+        ]
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+
+    def __str__(self):
+        return f'{self.user} - {self.ingredient} {self.total_amount}'
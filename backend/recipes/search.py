@@ -0,0 +1,180 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import (
+    Case,
+    CharField,
+    FloatField,
+    Func,
+    IntegerField,
+    Q,
+    Value,
+    When,
+)
+
+
+def normalize(value):
+    """Ключ поиска без учета регистра и различия между «е» и «ё»."""
+    return value.casefold().replace('ё', 'е')
+
+
+class SearchKey(Func):
+    """normalize() в SQL; по этому выражению построен триграммный индекс."""
+    template = "translate(lower(%(expressions)s), 'ё', 'е')"
+    output_field = CharField()
+
+
+def trigrams(key):
+    """Триграммы слов строки, как их считает pg_trgm."""
+    result = set()
+    for word in re.findall(r'\w+', key):
+        padded = f'  {word} '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class IngredientIndex:
+    """Отсортированный и триграммный индекс ингредиентов в памяти процесса.
+
+    Строится при первом обращении, сбрасывается сигналами при изменении
+    ингредиентов и перестраивается не реже чем раз в INGREDIENT_INDEX_TTL
+    секунд, чтобы подхватить изменения из других процессов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+
+    def invalidate(self):
+        self._data = None
+
+    def _build(self):
+        from recipes.models import Ingredient
+
+        rows = sorted(
+            (normalize(name), name, pk, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit').iterator()
+        )
+        keys = [key for key, *_ in rows]
+        items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, name, pk, measurement_unit in rows
+        ]
+        grams = [trigrams(key) for key in keys]
+        postings = defaultdict(list)
+        for position, key_grams in enumerate(grams):
+            for gram in key_grams:
+                postings[gram].append(position)
+        return time.monotonic(), keys, items, grams, postings
+
+    def _is_stale(self, data):
+        return data is None or (
+            time.monotonic() - data[0] > settings.INGREDIENT_INDEX_TTL)
+
+    def _get(self):
+        data = self._data
+        if self._is_stale(data):
+            with self._lock:
+                data = self._data
+                if self._is_stale(data):
+                    data = self._data = self._build()
+        return data
+
+    def all(self):
+        return self._get()[2]
+
+    def search(self, prefix, limit=None):
+        """Ингредиенты, название которых начинается с prefix."""
+        _, keys, items, *_ = self._get()
+        prefix = normalize(prefix)
+        limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+        result = []
+        position = bisect_left(keys, prefix)
+        while (position < len(keys) and len(result) < limit
+               and keys[position].startswith(prefix)):
+            result.append(items[position])
+            position += 1
+        return result
+
+    def ranked_search(self, query, limit=None):
+        """Совпадения по префиксу, затем по подстроке, затем похожие."""
+        _, keys, items, grams, postings = self._get()
+        query = normalize(query)
+        limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+        result = self.search(query, limit)
+        found = {item['id'] for item in result}
+
+        query_grams = trigrams(query)
+        shared = Counter(
+            position for gram in query_grams
+            for position in postings.get(gram, ())
+        )
+        if len(query) < 3:
+            candidates = range(len(keys))
+        else:
+            candidates = sorted(shared)
+        for position in candidates:
+            if len(result) >= limit:
+                return result
+            if (query in keys[position]
+                    and items[position]['id'] not in found):
+                result.append(items[position])
+                found.add(items[position]['id'])
+
+        similar = []
+        for position, count in shared.items():
+            if items[position]['id'] in found:
+                continue
+            similarity = count / (
+                len(query_grams) + len(grams[position]) - count)
+            if similarity >= settings.INGREDIENT_SIMILARITY_THRESHOLD:
+                similar.append((-similarity, position))
+        similar.sort()
+        result.extend(items[position] for _, position in similar)
+        return result[:limit]
+
+
+ingredient_index = IngredientIndex()
+
+
+def ranked_search(query, limit=None):
+    """Ранжированный поиск: pg_trgm на PostgreSQL, индекс в памяти иначе."""
+    if connection.vendor != 'postgresql':
+        return ingredient_index.ranked_search(query, limit)
+
+    from django.contrib.postgres.search import TrigramSimilarity
+    from recipes.models import Ingredient
+
+    query = normalize(query)
+    limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+    ingredients = (
+        Ingredient.objects
+        .annotate(key=SearchKey('name'))
+        .filter(Q(key__contains=query) | Q(key__trigram_similar=query))
+        .annotate(rank=Case(
+            When(key__startswith=query, then=Value(0)),
+            When(key__contains=query, then=Value(1)),
+            default=Value(2),
+            output_field=IntegerField(),
+        ))
+        .annotate(similarity=Case(
+            When(rank=2, then=TrigramSimilarity('key', query)),
+            default=Value(1.0),
+            output_field=FloatField(),
+        ))
+        .order_by('rank', '-similarity', 'key', 'name')
+        .values('id', 'name', 'measurement_unit')[:limit]
+    )
+    # Порог оператора % берется из настроек, как и в индексе в памяти;
+    # оператор, в отличие от сравнения similarity(), использует индекс.
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT set_config('pg_trgm.similarity_threshold', %s, true)",
+            [str(settings.INGREDIENT_SIMILARITY_THRESHOLD)])
+        return list(ingredients)
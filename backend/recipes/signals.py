@@ -0,0 +1,52 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    ShoppingCartTotal,
+)
+from .search import ingredient_index
+
+RECIPE_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+
+
+def update_recipe_counter(sender, instance, created=True, **kwargs):
+    """Счетчики рецепта при любом изменении, включая админку и каскады."""
+    if not created:
+        return
+    counter = RECIPE_COUNTERS[sender]
+    change = 1 if kwargs['signal'] is post_save else -1
+    Recipe.objects.filter(pk=instance.recipe_id).update(
+        **{counter: Greatest(F(counter) + change, 0)})
+
+
+for model in RECIPE_COUNTERS:
+    post_save.connect(update_recipe_counter, sender=model)
+    post_delete.connect(update_recipe_counter, sender=model)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_cart_totals(instance, created, **kwargs):
+    if created:
+        ShoppingCartTotal.objects.add_recipe(
+            instance.recipe_id, [instance.user_id])
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_cart_totals(instance, **kwargs):
+    """До удаления, пока ингредиенты рецепта еще не удалены каскадом."""
+    ShoppingCartTotal.objects.remove_recipe(
+        instance.recipe_id, [instance.user_id])
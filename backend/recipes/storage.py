@@ -0,0 +1,50 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_PATTERN = r'[0-9a-f]{2}/[0-9a-f]{64}\.\w+'
+
+
+def content_hash(content):
+    """SHA-256 содержимого файла, позиция чтения сбрасывается в начало."""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, в котором имя файла — хеш его содержимого.
+
+    Одинаковые файлы записываются один раз, а их адреса никогда не
+    меняют содержимое, поэтому могут кешироваться без ограничения срока.
+    Неиспользуемые файлы удаляет команда collect_orphan_images.
+    """
+
+    def hashed_name(self, name, content):
+        directory, filename = os.path.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+        digest = content_hash(content)
+        return os.path.join(directory, digest[:2], digest + ext)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Свежая дата изменения защищает файл от collect_orphan_images,
+            # пока ссылающийся на него рецепт еще не сохранен.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
+
+
+content_addressed_storage = ContentAddressedStorage()